@@ -1,16 +1,92 @@
 # app.py - Enhanced version with forced wkhtmltopdf installation
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify
 import subprocess
 import base64
 import os
 import shutil
 import tempfile
+import importlib.util
+import functools
+import uuid
+import hmac
+import json
+import re
 import requests
 from datetime import datetime
-import time
+import threading
+from result_store import FileResultStore, job_key, store_from_url, CLAIM_TTL
+from wait_learning import WaitTimeModel, DEFAULT_WAIT
+from chunked_render import render_chunked
+import render_trace
 
 app = Flask(__name__)
 
+# Render farm: number of renderer processes (0 = render in the request process,
+# "auto" = one per core)
+RENDER_FARM_WORKERS = os.environ.get("RENDER_FARM_WORKERS", "0")
+
+# Shared result store so any instance can serve a PDF rendered by another
+# (file:///path, sqlite:///path.db or redis://host:port/db; empty = off).
+# Only requests that carry a job_id / Idempotency-Key are shared.
+RESULT_STORE = os.environ.get("RESULT_STORE", "")
+
+# Opt-in: WeasyPrint renders tables longer than this many rows in separate
+# segments, so only one segment is laid out at a time (0 = one pass, default)
+CHUNK_ROWS = int(os.environ.get("CHUNK_ROWS", 0))
+
+# Learned per-host ready times, used when the caller leaves out wait_time.
+# Shared through the job store, so all workers and instances learn together.
+wait_model = WaitTimeModel(store=lambda: get_job_store())
+
+# When wait_time is left out, a page is ready once it sets
+# window.invoiceReady = true, or READY_SELECTOR matches, or - with no selector
+# configured - once its content has not changed for READY_QUIET_MS. The quiet
+# window is deliberately long so a spinner waiting on an XHR is not printed.
+READY_SELECTOR = os.environ.get("READY_SELECTOR", "")
+READY_QUIET_MS = int(os.environ.get("READY_QUIET_MS", 1500))
+
+# Polls for readiness and logs how it ended - "settled"/"signalled" with the
+# ms at which the page became ready, or "timeout" - before releasing
+# wkhtmltopdf via window.status. The log line reaches stderr through
+# --debug-javascript.
+READY_SCRIPT = (
+    "(function(){var start=Date.now(),deadline=%(deadline)d,quiet=%(quiet)d,"
+    "selector=%(selector)s,last=-1,changed=start;"
+    "function done(outcome,at){console.log('KAIRALI_READY '+outcome+' '+at);window.status='ready';}"
+    "function check(){var now=Date.now();"
+    "if(window.invoiceReady===true||(selector&&document.querySelector(selector))){done('signalled',now-start);return;}"
+    "var len=document.body?document.body.innerHTML.length:0;"
+    "if(len!==last||document.readyState!=='complete'){last=len;changed=now;}"
+    "else if(!selector&&len>0&&now-changed>=quiet){done('settled',changed-start);return;}"
+    "if(now-start>=deadline){done('timeout',now-start);return;}"
+    "window.setTimeout(check,100);}check();})();"
+)
+READY_LOG = re.compile(r"KAIRALI_READY (settled|signalled|timeout) (\d+)")
+
+def ready_script(wait_time):
+    """READY_SCRIPT allowing wait_time seconds for the page to become ready"""
+    return READY_SCRIPT % {
+        # A page that settles right at the limit still needs its quiet window
+        'deadline': wait_time * 1000 + (0 if READY_SELECTOR else READY_QUIET_MS),
+        'quiet': READY_QUIET_MS,
+        'selector': json.dumps(READY_SELECTOR)
+    }
+
+def record_ready_time(url, stderr_text, wait_time):
+    """Feed the page's own ready report to wait_model; nothing if it is missing"""
+    match = READY_LOG.search(stderr_text)
+    if not match:
+        print("No readiness report from the page, not learning from this render")
+        return
+    outcome, at_ms = match.group(1), int(match.group(2))
+    if outcome == 'timeout':
+        wait_model.record(url, wait_time, capped=True)
+    else:
+        wait_model.record(url, at_ms / 1000)
+
 def force_install_wkhtmltopdf():
     """Aggressively try to install wkhtmltopdf on Render"""
     try:
@@ -74,17 +150,31 @@ def check_wkhtmltopdf():
     """Check if wkhtmltopdf is available"""
     return shutil.which('wkhtmltopdf') is not None
 
-def convert_with_wkhtmltopdf_preload(url, wait_time=30):
-    """Pre-load content, then convert with wkhtmltopdf"""
+def convert_with_wkhtmltopdf_preload(url, wait_time=30, adaptive=False):
+    """Pre-load content, then convert with wkhtmltopdf.
+
+    With adaptive=True, wait_time is only an upper bound: the page is printed
+    as soon as it is ready and the time that took is fed to wait_model.
+    """
     try:
         print(f"Pre-loading content from: {url}")
         
         # First, fetch the page to trigger loading, then wait
-        response = requests.get(url, timeout=30)
+        with render_trace.timed_fetch(url) as fetch:
+            response = requests.get(url, timeout=30)
+            fetch['status'] = response.status_code
         print(f"Initial fetch completed, status: {response.status_code}")
         
         # Add extra wait time for the page to fully load its JavaScript
-        time.sleep(5)
+        if not adaptive:
+            time.sleep(5)
+        
+        if adaptive:
+            js_delay = 100
+            script = ready_script(wait_time)
+        else:
+            js_delay = wait_time * 1000
+            script = 'window.setTimeout(function(){window.status="ready";}, ' + str(wait_time * 1000) + ');'
         
         # Use wkhtmltopdf with aggressive JavaScript settings
         cmd = [
@@ -98,7 +188,7 @@ def convert_with_wkhtmltopdf_preload(url, wait_time=30):
             '--no-header-line',
             '--no-footer-line',
             '--enable-javascript',
-            '--javascript-delay', str(wait_time * 1000),  # Convert to milliseconds
+            '--javascript-delay', str(js_delay),  # Milliseconds
             '--debug-javascript',
             '--load-error-handling', 'ignore',
             '--load-media-error-handling', 'ignore',
@@ -111,34 +201,73 @@ def convert_with_wkhtmltopdf_preload(url, wait_time=30):
             '--allow', url,
             '--custom-header', 'User-Agent', 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             '--window-status', 'ready',  # Wait for window.status = 'ready'
-            '--run-script', 'window.setTimeout(function(){window.status="ready";}, ' + str(wait_time * 1000) + ');',
+            '--run-script', script,
             url,
             '-'
         ]
         
-        print(f"Running wkhtmltopdf with {wait_time}s JavaScript delay...")
+        if adaptive:
+            print(f"Running wkhtmltopdf, waiting up to {wait_time}s for content...")
+        else:
+            print(f"Running wkhtmltopdf with {wait_time}s JavaScript delay...")
         
+        render_trace.note('command', argv=cmd)
         result = subprocess.run(cmd, capture_output=True, timeout=180)
+        stderr_text = result.stderr.decode('utf-8', errors='ignore')
+        render_trace.note_stderr('wkhtmltopdf', stderr_text, result.returncode)
         
         if result.returncode == 0 and result.stdout:
             print(f"Success! PDF size: {len(result.stdout)} bytes")
+            if adaptive:
+                record_ready_time(url, stderr_text, wait_time)
             return result.stdout
         else:
-            stderr_text = result.stderr.decode('utf-8', errors='ignore')
             print(f"wkhtmltopdf failed. Stderr: {stderr_text[:300]}")
             return None
             
     except Exception as e:
         print(f"Error: {e}")
+        render_trace.note('engine', engine='wkhtmltopdf', error=str(e))
         return None
 
+_weasyprint_html = None
+_weasyprint_error = None
+
+def load_weasyprint():
+    """WeasyPrint's HTML class, imported on first use (or by warm_up), None if unusable.
+
+    A failed import is remembered: missing pango/cairo libraries raise
+    OSError rather than ImportError, and retrying on every request would not
+    help.
+    """
+    global _weasyprint_html, _weasyprint_error
+    if _weasyprint_html is None and _weasyprint_error is None:
+        try:
+            from weasyprint import HTML
+            _weasyprint_html = HTML
+        except Exception as e:
+            _weasyprint_error = f"{type(e).__name__}: {e}"
+            print(f"WeasyPrint unavailable: {_weasyprint_error}")
+    return _weasyprint_html
+
+def weasyprint_available():
+    """Whether WeasyPrint imported; before the first attempt, whether it is installed"""
+    if _weasyprint_html is not None or _weasyprint_error is not None:
+        return _weasyprint_html is not None
+    return importlib.util.find_spec('weasyprint') is not None
+
 def convert_with_weasyprint_fallback(url):
     """Fallback using WeasyPrint"""
     try:
-        from weasyprint import HTML
+        HTML = load_weasyprint()
+        if HTML is None:
+            print("WeasyPrint not available")
+            return None
         
         print("Using WeasyPrint fallback...")
-        response = requests.get(url, timeout=30)
+        with render_trace.timed_fetch(url) as fetch:
+            response = requests.get(url, timeout=30)
+            fetch['status'] = response.status_code
         html_content = response.text
         
         # Add some basic CSS for better formatting
@@ -158,26 +287,39 @@ def convert_with_weasyprint_fallback(url):
         else:
             html_content = enhanced_css + html_content
         
-        html_doc = HTML(string=html_content, base_url=url)
-        pdf_bytes = html_doc.write_pdf()
+        # Time sub-resource fetches (images, stylesheets) when tracing
+        fetcher = render_trace.url_fetcher()
+        if fetcher is not None:
+            HTML = functools.partial(HTML, url_fetcher=fetcher)
+        
+        pdf_bytes = None
+        if CHUNK_ROWS > 0:
+            try:
+                pdf_bytes = render_chunked(HTML, html_content, url, CHUNK_ROWS)
+            except Exception as e:
+                print(f"Segmented render failed, rendering in one pass: {e}")
+        if not pdf_bytes:
+            html_doc = HTML(string=html_content, base_url=url)
+            pdf_bytes = html_doc.write_pdf()
         
         print(f"WeasyPrint generated PDF ({len(pdf_bytes)} bytes)")
         return pdf_bytes
         
-    except ImportError:
-        print("WeasyPrint not available")
-        return None
     except Exception as e:
         print(f"WeasyPrint error: {e}")
+        render_trace.note('engine', engine='weasyprint', error=str(e))
         return None
 
-def convert_url_to_pdf(url, wait_time=20):
+def convert_url_to_pdf(url, wait_time=20, adaptive=False):
     """Main conversion function - try wkhtmltopdf first, fallback to WeasyPrint"""
-    
+    with render_trace.traced(url, wait_time=wait_time, adaptive=adaptive):
+        return _convert_url_to_pdf(url, wait_time, adaptive)
+
+def _convert_url_to_pdf(url, wait_time, adaptive):
     # Try wkhtmltopdf first (handles JavaScript)
     if check_wkhtmltopdf():
         print("wkhtmltopdf is available, using it...")
-        pdf_bytes = convert_with_wkhtmltopdf_preload(url, wait_time)
+        pdf_bytes = convert_with_wkhtmltopdf_preload(url, wait_time, adaptive)
         if pdf_bytes:
             return pdf_bytes
         else:
@@ -186,7 +328,7 @@ def convert_url_to_pdf(url, wait_time=20):
         print("wkhtmltopdf not available, trying to install...")
         if force_install_wkhtmltopdf():
             print("wkhtmltopdf installed successfully, trying conversion...")
-            pdf_bytes = convert_with_wkhtmltopdf_preload(url, wait_time)
+            pdf_bytes = convert_with_wkhtmltopdf_preload(url, wait_time, adaptive)
             if pdf_bytes:
                 return pdf_bytes
         
@@ -195,6 +337,308 @@ def convert_url_to_pdf(url, wait_time=20):
     # Fallback to WeasyPrint
     return convert_with_weasyprint_fallback(url)
 
+_farm = None
+_farm_lock = threading.Lock()
+_farm_next_cpu = None
+_renderer_barrier = None
+# This gunicorn worker's share of the cores: slot k of n workers
+_farm_slot = (0, 1)
+
+def _available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+def farm_size():
+    """Number of renderer processes configured for the render farm (per gunicorn worker)"""
+    if RENDER_FARM_WORKERS.strip().lower() == "auto":
+        return max(1, len(_available_cpus()) // _farm_slot[1])
+    try:
+        return max(0, int(RENDER_FARM_WORKERS))
+    except ValueError:
+        return 0
+
+def _farm_worker_init(next_cpu, first_cpu, barrier):
+    """Pin each renderer process to its own core, starting at this worker's share"""
+    global _renderer_barrier
+    _renderer_barrier = barrier
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+        with next_cpu.get_lock():
+            cpu = cpus[(first_cpu + next_cpu.value) % len(cpus)]
+            next_cpu.value += 1
+        os.sched_setaffinity(0, {cpu})
+        print(f"Renderer {os.getpid()} pinned to CPU {cpu}")
+    except (AttributeError, OSError) as e:
+        print(f"CPU pinning unavailable: {e}")
+    # Ready times measured here belong to the parent's model
+    wait_model.forward = True
+
+def _farm_ready():
+    """Held until every renderer is running, so start_farm() launches them all"""
+    _renderer_barrier.wait(timeout=60)
+    return os.getpid()
+
+def _farm_render(url, wait_time, adaptive=False):
+    """Runs inside a renderer process, hands the PDF back via shared memory"""
+    from multiprocessing import shared_memory
+
+    pdf_bytes = convert_url_to_pdf(url, wait_time, adaptive)
+    observations = wait_model.take_pending()
+    if not pdf_bytes:
+        return None, 0, observations
+    shm = shared_memory.SharedMemory(create=True, size=len(pdf_bytes))
+    shm.buf[:len(pdf_bytes)] = pdf_bytes
+    name = shm.name
+    shm.close()
+    return name, len(pdf_bytes), observations
+
+def _farm_collect(handle):
+    """Copy a PDF out of shared memory and release the segment"""
+    from multiprocessing import shared_memory
+
+    name, size, observations = handle
+    for observation in observations:
+        wait_model.record(*observation)
+    if not name:
+        return None
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _build_farm(start_method):
+    # Only loaded when the farm is on, like the PDF engines
+    import multiprocessing
+    from multiprocessing import resource_tracker
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _farm, _farm_next_cpu
+    workers = farm_size()
+    # Share one resource tracker with the renderers so segments they
+    # create are released when we unlink them here
+    resource_tracker.ensure_running()
+    ctx = multiprocessing.get_context(start_method)
+    _farm_next_cpu = ctx.Value('i', 0)
+    first_cpu = _farm_slot[0] * workers
+    _farm = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                initializer=_farm_worker_init,
+                                initargs=(_farm_next_cpu, first_cpu, ctx.Barrier(workers)))
+    print(f"Render farm created with {workers} renderer processes ({start_method})")
+    return workers
+
+def start_farm(slot=0, slots=1):
+    """Start the renderer processes; called from gunicorn's post_fork hook.
+
+    The executor only forks its processes when work is submitted, so one
+    task per renderer is submitted here and held on a barrier until all of
+    them run. That way every fork happens now, before the worker has any
+    threads. slot/slots give each gunicorn worker its own cores.
+    """
+    global _farm_slot
+    _farm_slot = (slot, max(1, slots))
+    if farm_size() <= 0:
+        return
+    with _farm_lock:
+        if _farm is not None:
+            return
+        workers = _build_farm("fork")
+        futures = [_farm.submit(_farm_ready) for _ in range(workers)]
+        pids = {future.result() for future in futures}
+        print(f"Render farm running: {len(pids)} renderer processes (core block {slot})")
+
+def get_farm():
+    """The render farm, or None when it is disabled.
+
+    If the farm was never started from post_fork (e.g. gunicorn without
+    gunicorn.conf.py), or a renderer died and it was discarded, it is built
+    here from a request thread, so forkserver is used instead of fork.
+    """
+    if farm_size() <= 0:
+        return None
+    with _farm_lock:
+        if _farm is None:
+            _build_farm("forkserver")
+        return _farm
+
+def _discard_farm(farm):
+    """Drop a farm whose renderer died - the executor cannot be used again"""
+    global _farm
+    with _farm_lock:
+        if _farm is farm:
+            _farm = None
+    farm.shutdown(wait=False, cancel_futures=True)
+
+def render_many(urls, wait_time=20):
+    """Render several URLs, spreading them across the render farm.
+
+    Renderers pull jobs from one shared queue as they become idle, so a long
+    invoice only occupies its own core while short ones keep flowing through
+    the others. A wait_time of None uses each URL's learned timeout.
+    """
+    if wait_time is None:
+        jobs = [(url, wait_model.timeout_for(url), True) for url in urls]
+    else:
+        jobs = [(url, wait_time, False) for url in urls]
+
+    farm = get_farm()
+    if farm is None:
+        return [convert_url_to_pdf(*job) for job in jobs]
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        futures = [farm.submit(_farm_render, *job) for job in jobs]
+    except BrokenProcessPool:
+        print("Render farm is broken, rendering in-process")
+        _discard_farm(farm)
+        return [convert_url_to_pdf(*job) for job in jobs]
+
+    results = []
+    broken = False
+    for job, future in zip(jobs, futures):
+        try:
+            results.append(_farm_collect(future.result()))
+        except BrokenProcessPool:
+            # A renderer was killed (segfault, OOM); finish this batch here
+            # and let the next request start a fresh farm
+            if not broken:
+                print("Renderer process died, rendering the rest in-process")
+                _discard_farm(farm)
+                broken = True
+            results.append(convert_url_to_pdf(*job))
+        except Exception as e:
+            print(f"Renderer error: {e}")
+            results.append(None)
+    return results
+
+_store = None
+_local_jobs = None
+
+def get_result_store():
+    """The shared result store, or None when RESULT_STORE is not set"""
+    global _store
+    if _store is None and RESULT_STORE:
+        _store = store_from_url(RESULT_STORE)
+    return _store
+
+def get_job_store():
+    """Store for async job state - shared if configured, otherwise per host"""
+    global _local_jobs
+    store = get_result_store()
+    if store is not None:
+        return store
+    if _local_jobs is None:
+        _local_jobs = FileResultStore(os.path.join(tempfile.gettempdir(), 'kairali_jobs'))
+    return _local_jobs
+
+def job_in_progress(job):
+    """True if a queued/rendering job was updated recently enough to still be alive"""
+    return (job is not None and job.get('state') in ('queued', 'rendering')
+            and time.time() - job.get('updated', 0) < CLAIM_TTL)
+
+def _wait_for_other_node(store, key, url, wait_time):
+    """Another node holds the claim - wait for its result, take over if it dies"""
+    started = time.time()
+    deadline = started + CLAIM_TTL
+    while time.time() < deadline:
+        pdf_bytes = store.get_pdf(key)
+        if pdf_bytes:
+            return pdf_bytes
+        job = store.get_job(key)
+        # Only a failure of the attempt we waited on counts, not an earlier one
+        if job and job.get('state') == 'failed' and job.get('updated', 0) >= started:
+            return None
+        if store.claim(key):
+            print(f"Taking over abandoned render: {url}")
+            return _render_claimed(store, [key], [url], wait_time)[0]
+        time.sleep(0.5)
+    return None
+
+def _render_claimed(store, keys, urls, wait_time):
+    """Render URLs this node has claimed and publish the results"""
+    for key in keys:
+        store.set_job(key, 'rendering', node=os.uname().nodename)
+    try:
+        results = render_many(urls, wait_time)
+        for key, pdf_bytes in zip(keys, results):
+            if pdf_bytes:
+                store.put_pdf(key, pdf_bytes)
+                store.set_job(key, 'done', size_bytes=len(pdf_bytes))
+            else:
+                store.set_job(key, 'failed', error='PDF generation failed')
+        return results
+    finally:
+        for key in keys:
+            store.release(key)
+
+def convert_many(urls, wait_time=20, store=None, keys=None):
+    """Convert several URLs, reusing results any instance already rendered.
+
+    keys are the job keys of the URLs (see request_job_keys); without them
+    nothing is shared and every URL is rendered. Each key is claimed in the
+    store before rendering, so instances sharing a store split a batch
+    between them instead of rendering it twice.
+    """
+    store = store or get_result_store()
+    if store is None or keys is None:
+        return render_many(urls, wait_time)
+
+    results = [None] * len(urls)
+    claimed, waiting = [], []
+    for i, (url, key) in enumerate(zip(urls, keys)):
+        pdf_bytes = store.get_pdf(key)
+        if pdf_bytes:
+            print(f"Serving stored result for {url}")
+            results[i] = pdf_bytes
+        elif store.claim(key):
+            claimed.append(i)
+        else:
+            waiting.append(i)
+
+    if claimed:
+        rendered = _render_claimed(store, [keys[i] for i in claimed],
+                                   [urls[i] for i in claimed], wait_time)
+        for i, pdf_bytes in zip(claimed, rendered):
+            results[i] = pdf_bytes
+
+    for i in waiting:
+        results[i] = _wait_for_other_node(store, keys[i], urls[i], wait_time)
+
+    return results
+
+def request_job_keys(data, urls, wait_time):
+    """Store keys for a request's URLs, or None if the caller sent no job id.
+
+    A retry with the same job_id (or Idempotency-Key header), URLs and
+    wait_time gets the same keys on any instance.
+    """
+    job_id = data.get('job_id') or request.headers.get('Idempotency-Key')
+    if not job_id:
+        return None
+    return [job_key(job_id, i, url, wait_time) for i, url in enumerate(urls)]
+
+def parse_wait_time(data):
+    """Caller's wait_time, or None to use the learned per-host timeout"""
+    wait_time = data.get('wait_time')
+    return int(wait_time) if wait_time is not None else None
+
+def describe_wait(wait_time):
+    return f"{wait_time}s" if wait_time is not None else "learned"
+
+def pdf_response_fields(pdf_bytes, suffix=""):
+    """Response fields for a successfully generated PDF"""
+    pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return {
+        'success': True,
+        'pdf_base64': pdf_base64,
+        'filename': f"kairali_invoice_{timestamp}{suffix}.pdf",
+        'size_bytes': len(pdf_bytes)
+    }
+
 @app.route("/convert-to-pdf-base64", methods=["POST"])
 def convert_to_pdf_base64():
     try:
@@ -203,25 +647,16 @@ def convert_to_pdf_base64():
             return jsonify({'error': 'JSON required', 'success': False}), 400
             
         url = data.get('url')
-        wait_time = int(data.get('wait_time', 20))  # Increased default
+        wait_time = parse_wait_time(data)
 
         if not url:
             return jsonify({'error': 'URL required', 'success': False}), 400
 
-        print(f"Converting: {url} (wait: {wait_time}s)")
-        pdf_bytes = convert_url_to_pdf(url, wait_time)
+        print(f"Converting: {url} (wait: {describe_wait(wait_time)})")
+        pdf_bytes = convert_many([url], wait_time, keys=request_job_keys(data, [url], wait_time))[0]
 
         if pdf_bytes:
-            pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"kairali_invoice_{timestamp}.pdf"
-            
-            return jsonify({
-                'success': True,
-                'pdf_base64': pdf_base64,
-                'filename': filename,
-                'size_bytes': len(pdf_bytes)
-            })
+            return jsonify(pdf_response_fields(pdf_bytes))
         else:
             return jsonify({'error': 'PDF generation failed', 'success': False}), 500
 
@@ -229,22 +664,140 @@ def convert_to_pdf_base64():
         print(f"Error: {e}")
         return jsonify({'error': str(e), 'success': False}), 500
 
+@app.route("/convert-batch", methods=["POST"])
+def convert_batch():
+    """Convert a list of URLs in one call using all renderer processes"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'JSON required', 'success': False}), 400
+
+        urls = data.get('urls')
+        wait_time = parse_wait_time(data)
+
+        if not urls or not isinstance(urls, list):
+            return jsonify({'error': 'urls list required', 'success': False}), 400
+
+        print(f"Batch converting {len(urls)} URLs (wait: {describe_wait(wait_time)})")
+        results = []
+        keys = request_job_keys(data, urls, wait_time)
+        for i, (url, pdf_bytes) in enumerate(zip(urls, convert_many(urls, wait_time, keys=keys))):
+            if pdf_bytes:
+                result = pdf_response_fields(pdf_bytes, suffix=f"_{i + 1}")
+            else:
+                result = {'error': 'PDF generation failed', 'success': False}
+            result['url'] = url
+            results.append(result)
+
+        return jsonify({
+            'success': all(r['success'] for r in results),
+            'results': results
+        })
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e), 'success': False}), 500
+
+@app.route("/convert-async", methods=["POST"])
+def convert_async():
+    """Start a conversion in the background and return a job id to poll"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'JSON required', 'success': False}), 400
+
+        url = data.get('url')
+        wait_time = parse_wait_time(data)
+
+        if not url:
+            return jsonify({'error': 'URL required', 'success': False}), 400
+
+        store = get_job_store()
+        keys = request_job_keys(data, [url], wait_time)
+        key = keys[0] if keys else uuid.uuid4().hex
+        job = store.get_job(key)
+        done = job and job.get('state') == 'done' and store.get_pdf(key)
+        # A queued/rendering job whose node died goes stale and is restarted
+        if not (done or job_in_progress(job)):
+            store.set_job(key, 'queued', url=url)
+            threading.Thread(target=convert_many, args=([url], wait_time, store, [key]),
+                             daemon=True).start()
+            job = store.get_job(key) or {'state': 'queued'}
+
+        return jsonify({'success': True, 'job_id': key, 'state': job.get('state')}), 202
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e), 'success': False}), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """State of an async job, with the PDF once it is done (from any instance)"""
+    store = get_job_store()
+    job = store.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job', 'success': False}), 404
+
+    response = {'success': job.get('state') != 'failed', 'job_id': job_id}
+    response.update(job)
+    if job.get('state') == 'done':
+        pdf_bytes = store.get_pdf(job_id)
+        if pdf_bytes:
+            response.update(pdf_response_fields(pdf_bytes))
+    return jsonify(response)
+
+@app.route("/wait-times", methods=["GET"])
+def wait_times():
+    """Ready times learned per host/URL pattern"""
+    return jsonify({
+        "patterns": wait_model.stats(),
+        "default_wait_time": DEFAULT_WAIT
+    })
+
+def admin_authorized():
+    """Admin endpoints require X-Admin-Token to match ADMIN_TOKEN; closed when it is unset"""
+    token = os.environ.get("ADMIN_TOKEN")
+    if not token:
+        return False
+    supplied = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+@app.route("/admin/slow-renders", methods=["GET"])
+def slow_renders():
+    """Captured slow conversions, newest first"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden', 'success': False}), 403
+    return jsonify({
+        "enabled": render_trace.enabled(),
+        "threshold_seconds": render_trace.SLOW_SECONDS,
+        "max_captures": render_trace.MAX_CAPTURES,
+        "captures": render_trace.list_captures()
+    })
+
+@app.route("/admin/slow-renders/<capture_id>", methods=["GET"])
+def slow_render(capture_id):
+    """Full capture: command line, engine stderr, fetch timings and profile"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden', 'success': False}), 403
+    capture = render_trace.load_capture(capture_id)
+    if not capture:
+        return jsonify({'error': 'Unknown capture', 'success': False}), 404
+    return jsonify(capture)
+
 @app.route("/health", methods=["GET"])
 def health():
     wkhtmltopdf_available = check_wkhtmltopdf()
     wkhtmltopdf_path = shutil.which('wkhtmltopdf')
     
-    try:
-        from weasyprint import HTML
-        weasyprint_available = True
-    except ImportError:
-        weasyprint_available = False
-    
     return jsonify({
         "status": "healthy",
         "wkhtmltopdf_available": wkhtmltopdf_available,
         "wkhtmltopdf_path": wkhtmltopdf_path,
-        "weasyprint_available": weasyprint_available,
+        "weasyprint_available": weasyprint_available(),
+        "weasyprint_error": _weasyprint_error,
+        "cold_start": dict(cold_start, worker_pid=os.getpid()),
+        "render_farm_workers": farm_size(),
+        "result_store": RESULT_STORE.split('://')[0] if RESULT_STORE else None,
         "service": "Kairali PDF API (Enhanced)"
     })
 
@@ -270,15 +823,50 @@ def home():
         "endpoints": {
             "/health": "GET - System status",
             "/force-install": "POST - Force install wkhtmltopdf",
-            "/convert-to-pdf-base64": "POST - Convert URL to PDF"
+            "/convert-to-pdf-base64": "POST - Convert URL to PDF",
+            "/convert-batch": "POST - Convert a list of URLs to PDFs",
+            "/convert-async": "POST - Start a conversion, returns a job id",
+            "/jobs/<job_id>": "GET - Async job state and PDF",
+            "/wait-times": "GET - Learned wait times per host",
+            "/admin/slow-renders": "GET - Captured slow conversions"
         }
     })
 
-# Try to install wkhtmltopdf at startup
-if not check_wkhtmltopdf():
-    print("wkhtmltopdf not found at startup, attempting installation...")
-    force_install_wkhtmltopdf()
+cold_start = {
+    "import_seconds": round(time.perf_counter() - _import_started, 3),
+    "warm_up_seconds": None,
+    "warmed_pid": None
+}
+
+def warm_up():
+    """One-time startup work, run in the gunicorn master before it forks.
+
+    Workers inherit the imported engines and warmed font caches
+    copy-on-write instead of each paying for them on their first request.
+    Never raises: a failed warm-up only means the first request pays instead.
+    """
+    started = time.perf_counter()
+
+    try:
+        # Try to install wkhtmltopdf at startup
+        if not check_wkhtmltopdf():
+            print("wkhtmltopdf not found at startup, attempting installation...")
+            force_install_wkhtmltopdf()
+
+        HTML = load_weasyprint()
+        if HTML is not None:
+            # Loads fontconfig and Pango caches
+            HTML(string="<p>warm-up</p>").write_pdf()
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+
+    cold_start["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+    cold_start["warmed_pid"] = os.getpid()
+    print(f"Warm-up done in {cold_start['warm_up_seconds']}s "
+          f"(import {cold_start['import_seconds']}s)")
 
 if __name__ == "__main__":
+    warm_up()
+    start_farm()
     port = int(os.environ.get("PORT", 10000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -1,8 +1,5 @@
 # app.py - Fixed version for Railway
 from flask import Flask, request, jsonify
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import base64
 import os
 import time
@@ -40,6 +37,11 @@ def convert_url_to_pdf_chrome(url, wait_time=25):
     driver = None
     
     try:
+        # Imported here so the service boots without loading Selenium
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
         chrome_binary = find_chrome_binary()
         print(f"Converting URL: {url}")
         print(f"Wait time: {wait_time} seconds")
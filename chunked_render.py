@@ -0,0 +1,129 @@
+# chunked_render.py - Lay out very long invoices in row batches to bound layout memory
+import io
+import re
+
+# Continues the page counter across segments, for documents that print it
+# themselves. A rule that touches the page counter gets no implicit
+# increment in WeasyPrint, so the reset value is the first page's number.
+SEGMENT_CSS = "@page :first { counter-reset: page %d; }"
+
+# Linked or imported stylesheets are not inspected for counter(pages)
+_EXTERNAL_CSS = re.compile(r"<link\b[^>]*\bstylesheet\b|@import\b", re.IGNORECASE)
+
+def _body_rows(table):
+    """(parent, row) pairs for the rows of a table outside its thead/tfoot"""
+    rows = []
+    for child in table:
+        if child.tag == 'tr':
+            rows.append((table, child))
+        elif child.tag == 'tbody':
+            rows.extend((child, tr) for tr in child if tr.tag == 'tr')
+    return rows
+
+def _path_to(root, target):
+    """Elements from root down to target"""
+    parents = {child: parent for parent in root.iter() for child in parent}
+    path = [target]
+    while path[-1] is not root:
+        path.append(parents[path[-1]])
+    return list(reversed(path))
+
+def split_into_segments(html_content, rows_per_segment):
+    """Yield one HTML document per batch of rows of the longest table.
+
+    Content before the table only appears in the first segment and content
+    after it (totals, notes) only in the last. Yields nothing when no table
+    is long enough to be worth splitting.
+    """
+    import html5lib
+
+    # The full tree keeps the DOCTYPE, and html5lib's own serializer writes
+    # inline SVG/MathML back as plain HTML
+    parser = html5lib.HTMLParser(tree=html5lib.getTreeBuilder('etree', fullTree=True),
+                                 namespaceHTMLElements=False)
+    root = parser.parse(html_content)
+    html = root.find('html')
+    body = html.find('body') if html is not None else None
+    tables = [(len(_body_rows(t)), t) for t in root.iter('table')] if body is not None else []
+    if not tables:
+        return
+    row_count, table = max(tables, key=lambda t: t[0])
+    if row_count <= rows_per_segment:
+        return
+
+    rows = _body_rows(table)
+    for parent, row in rows:
+        parent.remove(row)
+
+    # Children of every element between body and the table, split around the path
+    path = _path_to(body, table)
+    layers = []
+    for parent, child in zip(path, path[1:]):
+        children = list(parent)
+        index = children.index(child)
+        # Text directly before/after child sits in parent.text/child.tail
+        layers.append((parent, parent.text, children[:index], child, child.tail, children[index + 1:]))
+
+    for start in range(0, row_count, rows_per_segment):
+        first = start == 0
+        last = start + rows_per_segment >= row_count
+        for parent, text, before, child, tail, after in layers:
+            parent[:] = (before if first else []) + [child] + (after if last else [])
+            parent.text = text if first else None
+            child.tail = tail if last else None
+        batch = rows[start:start + rows_per_segment]
+        for parent, row in batch:
+            parent.append(row)
+        yield html5lib.serialize(root, tree='etree', omit_optional_tags=False)
+        for parent, row in batch:
+            parent.remove(row)
+
+def render_chunked(HTML, html_content, base_url, rows_per_segment):
+    """Render html_content segment by segment and concatenate the PDFs.
+
+    Only one segment's layout (WeasyPrint's box tree, by far the largest
+    cost) is alive at a time. The parsed HTML and the merged PDF are still
+    held in memory whole, so memory grows with the output size, not the
+    layout size. Returns None when the document has no table long enough to
+    split, prints a total page count (counter(pages) would restart per
+    segment), pulls in stylesheets that could print one, or pypdf is not
+    installed.
+    """
+    if 'counter(pages)' in html_content.replace(' ', ''):
+        print("Document prints a total page count, rendering in one pass")
+        return None
+    if _EXTERNAL_CSS.search(html_content):
+        print("Document links stylesheets, rendering in one pass")
+        return None
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        print("pypdf not available, rendering in one pass")
+        return None
+
+    writer = PdfWriter()
+    try:
+        page_offset = 0
+        segments = 0
+        for segment_html in split_into_segments(html_content, rows_per_segment):
+            css = "<style>" + (SEGMENT_CSS % (page_offset + 1)) + "</style>"
+            if '</head>' in segment_html:
+                segment_html = segment_html.replace('</head>', css + '</head>', 1)
+            else:
+                segment_html = css + segment_html
+
+            document = HTML(string=segment_html, base_url=base_url).render()
+            page_offset += len(document.pages)
+            segment_pdf = document.write_pdf()
+            del document
+            writer.append(io.BytesIO(segment_pdf))
+            segments += 1
+            print(f"Rendered segment {segments} (pages so far: {page_offset})")
+
+        if not segments:
+            return None
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+    finally:
+        writer.close()
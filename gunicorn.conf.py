@@ -0,0 +1,44 @@
+# gunicorn.conf.py - Loaded automatically by gunicorn from the working directory
+import os
+
+# Import the app and warm the PDF engines once in the master, then fork, so
+# every worker shares those pages instead of re-importing them per worker
+preload_app = True
+
+# Conversions spend most of their time waiting on wkhtmltopdf or the render
+# farm, so each worker serves several requests at once on threads. With the
+# farm on, keep at least one thread per renderer so no core sits idle.
+worker_class = "gthread"
+
+def _farm_renderers():
+    setting = os.environ.get("RENDER_FARM_WORKERS", "0").strip().lower()
+    if setting == "auto":
+        return os.cpu_count() or 1
+    try:
+        return max(0, int(setting))
+    except ValueError:
+        return 0
+
+threads = int(os.environ.get("GUNICORN_THREADS", 0)) or max(4, _farm_renderers())
+
+def on_starting(server):
+    import app
+    try:
+        app.warm_up()
+    except Exception as e:
+        # Never keep the service from booting - requests fall back as before
+        server.log.warning(f"Warm-up failed: {e}")
+
+def pre_fork(server, worker):
+    # Give the new worker the lowest core block no live worker holds, so a
+    # replacement worker takes over the block of the one it replaces
+    taken = {getattr(w, 'farm_slot', None) for w in server.WORKERS.values()}
+    slot = 0
+    while slot in taken:
+        slot += 1
+    worker.farm_slot = slot
+
+def post_fork(server, worker):
+    # Start this worker's renderers before it has any threads
+    import app
+    app.start_farm(slot=worker.farm_slot, slots=max(server.num_workers, worker.farm_slot + 1))
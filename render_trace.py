@@ -0,0 +1,155 @@
+# render_trace.py - Opt-in capture of slow conversions for post-mortem profiling
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Conversions slower than this many seconds are captured (unset = tracing off)
+SLOW_SECONDS = None
+CAPTURE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), 'kairali_slow_renders'))
+MAX_CAPTURES = 50
+try:
+    MAX_CAPTURES = max(1, int(os.environ.get("PROFILE_MAX_CAPTURES", MAX_CAPTURES)))
+    if os.environ.get("PROFILE_SLOW_SECONDS"):
+        SLOW_SECONDS = float(os.environ["PROFILE_SLOW_SECONDS"])
+except ValueError as e:
+    # Tracing is opt-in - a typo must not keep the service from booting
+    print(f"Slow-render tracing disabled, bad PROFILE_* setting: {e}")
+    SLOW_SECONDS = None
+MAX_STDERR = 64 * 1024
+PROFILE_LINES = 40
+
+_local = threading.local()
+
+def enabled():
+    return SLOW_SECONDS is not None
+
+def note(kind, **fields):
+    """Add an event to the conversion being traced on this thread, if any"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        fields['kind'] = kind
+        fields['at_seconds'] = round(time.time() - trace['started'], 3)
+        trace['events'].append(fields)
+
+def note_stderr(engine, stderr_text, returncode):
+    note('engine', engine=engine, returncode=returncode, stderr=stderr_text[-MAX_STDERR:])
+
+@contextmanager
+def timed_fetch(url):
+    """Time a fetch made for the traced conversion"""
+    started = time.time()
+    fields = {'url': url}
+    try:
+        yield fields
+    except Exception as e:
+        fields['error'] = str(e)
+        raise
+    finally:
+        fields['seconds'] = round(time.time() - started, 3)
+        note('fetch', **fields)
+
+def url_fetcher():
+    """WeasyPrint url_fetcher that records sub-resource timings, None when not tracing"""
+    if getattr(_local, 'trace', None) is None:
+        return None
+    from weasyprint import default_url_fetcher
+
+    def fetcher(url, *args, **kwargs):
+        with timed_fetch(url) as fields:
+            result = default_url_fetcher(url, *args, **kwargs)
+            fields['mime_type'] = result.get('mime_type')
+            return result
+    return fetcher
+
+@contextmanager
+def traced(url, **info):
+    """Trace one conversion; keep a capture on disk if it ran past SLOW_SECONDS"""
+    if not enabled() or getattr(_local, 'trace', None) is not None:
+        yield
+        return
+
+    import cProfile
+    import pstats
+
+    trace = {'url': url, 'started': time.time(), 'events': [], 'pid': os.getpid()}
+    trace.update(info)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active (Python 3.12+ allows only one)
+        profiler = None
+    _local.trace = trace
+    try:
+        yield
+    finally:
+        _local.trace = None
+        if profiler is not None:
+            profiler.disable()
+        duration = time.time() - trace['started']
+        if duration >= SLOW_SECONDS:
+            trace['duration_seconds'] = round(duration, 3)
+            if profiler is not None:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+                trace['profile'] = out.getvalue()
+            try:
+                save_capture(trace)
+            except Exception as e:
+                print(f"Could not save slow-render capture: {e}")
+
+def save_capture(trace):
+    """Write a capture and drop the oldest ones beyond MAX_CAPTURES"""
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    started = trace['started']
+    stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(started))
+    capture_id = f"{stamp}{int(started * 1000) % 1000:03d}_{uuid.uuid4().hex[:8]}"
+    trace['id'] = capture_id
+    filename = os.path.join(CAPTURE_DIR, f"{capture_id}.json")
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(trace, f)
+    os.replace(tmp, filename)
+    print(f"Slow render ({trace['duration_seconds']}s) captured as {capture_id}")
+
+    for old in list_capture_ids()[:-MAX_CAPTURES]:
+        try:
+            os.remove(os.path.join(CAPTURE_DIR, f"{old}.json"))
+        except FileNotFoundError:
+            pass
+
+def list_capture_ids():
+    """Capture ids, oldest first"""
+    try:
+        names = os.listdir(CAPTURE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+def load_capture(capture_id):
+    if os.path.basename(capture_id) != capture_id:
+        return None
+    try:
+        with open(os.path.join(CAPTURE_DIR, f"{capture_id}.json"), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def list_captures():
+    """Summaries of the stored captures, newest first"""
+    summaries = []
+    for capture_id in reversed(list_capture_ids()):
+        capture = load_capture(capture_id)
+        if capture:
+            summaries.append({
+                'id': capture_id,
+                'url': capture.get('url'),
+                'duration_seconds': capture.get('duration_seconds'),
+                'started': capture.get('started')
+            })
+    return summaries
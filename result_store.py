@@ -0,0 +1,367 @@
+# result_store.py - Shared storage for rendered PDFs and job state across instances
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+# How long a node may hold a render claim before others assume it died
+CLAIM_TTL = int(os.environ.get("RESULT_STORE_CLAIM_TTL", 300))
+
+# How long a finished PDF or job record is kept - long enough for retries and
+# polling, short enough that a changed invoice is not served stale for long
+RESULT_TTL = int(os.environ.get("RESULT_STORE_TTL", 3600))
+
+# Longest a state update may hold its Redis lock
+STATE_LOCK_TTL = 10
+
+# Expired records are swept on writes, at most this often per store instance
+SWEEP_INTERVAL = 60
+
+def job_key(*parts):
+    """Stable job id for a caller's job id plus request options, the same on every instance"""
+    joined = '\x1f'.join(str(part) for part in parts)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()[:32]
+
+class ResultStore:
+    """Base interface - every backend stores PDFs, job state and render claims.
+
+    PDFs and job records expire after result_ttl seconds, and are deleted by
+    sweep(), which writes run every SWEEP_INTERVAL seconds. State values
+    (get_state/update_state) live in their own key space and never expire.
+    """
+
+    result_ttl = RESULT_TTL
+    _last_sweep = 0.0
+
+    def get_pdf(self, key):
+        raise NotImplementedError
+
+    def put_pdf(self, key, pdf_bytes):
+        raise NotImplementedError
+
+    def get_job(self, key):
+        raise NotImplementedError
+
+    def set_job(self, key, state, **extra):
+        raise NotImplementedError
+
+    def claim(self, key, ttl=CLAIM_TTL):
+        """Atomically take the right to render key; False if another node has it"""
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def get_state(self, key):
+        raise NotImplementedError
+
+    def update_state(self, key, update):
+        """Atomically replace state key with update(current value or None)"""
+        raise NotImplementedError
+
+    def sweep(self):
+        """Delete expired results, job records and abandoned claims"""
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        try:
+            self.sweep()
+        except Exception as e:
+            print(f"Result store sweep failed: {e}")
+
+    def _job_record(self, state, extra):
+        record = {'state': state, 'updated': time.time()}
+        record.update(extra)
+        return record
+
+    def _expired(self, updated):
+        return updated is None or time.time() - updated > self.result_ttl
+
+class FileResultStore(ResultStore):
+    """Directory on a local or shared filesystem"""
+
+    def __init__(self, path, result_ttl=RESULT_TTL):
+        self.path = path
+        self.result_ttl = result_ttl
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key, ext):
+        return os.path.join(self.path, f"{key}.{ext}")
+
+    def _write_atomic(self, filename, data):
+        tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+
+    def get_pdf(self, key):
+        filename = self._file(key, 'pdf')
+        try:
+            if self._expired(os.path.getmtime(filename)):
+                os.remove(filename)
+                return None
+            with open(filename, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_pdf(self, key, pdf_bytes):
+        self._write_atomic(self._file(key, 'pdf'), pdf_bytes)
+        self._maybe_sweep()
+
+    def get_job(self, key):
+        try:
+            with open(self._file(key, 'json'), 'r') as f:
+                job = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return None if self._expired(job.get('updated')) else job
+
+    def set_job(self, key, state, **extra):
+        record = self._job_record(state, extra)
+        self._write_atomic(self._file(key, 'json'), json.dumps(record).encode('utf-8'))
+        self._maybe_sweep()
+
+    def claim(self, key, ttl=CLAIM_TTL):
+        lock = self._file(key, 'lock')
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return True
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.path.getmtime(lock) < ttl:
+                    return False
+                # Stale claim from a dead node: move it aside atomically, so
+                # only one node takes it over
+                stale = f"{lock}.{os.getpid()}.{threading.get_ident()}.stale"
+                os.rename(lock, stale)
+            except FileNotFoundError:
+                continue
+            fresh = time.time() - os.path.getmtime(stale) < ttl
+            if fresh:
+                # Another node re-claimed it between our check and the rename -
+                # put its lock back unless it has been replaced already
+                try:
+                    os.link(stale, lock)
+                except FileExistsError:
+                    pass
+            os.remove(stale)
+            if fresh:
+                return False
+        return False
+
+    def release(self, key):
+        try:
+            os.remove(self._file(key, 'lock'))
+        except FileNotFoundError:
+            pass
+
+    def _state_file(self, key, ext):
+        states = os.path.join(self.path, 'states')
+        os.makedirs(states, exist_ok=True)
+        return os.path.join(states, f"{key}.{ext}")
+
+    def _read_state(self, key):
+        try:
+            with open(self._state_file(key, 'json'), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_state(self, key):
+        return self._read_state(key)
+
+    def update_state(self, key, update):
+        with open(self._state_file(key, 'lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                value = update(self._read_state(key))
+                self._write_atomic(self._state_file(key, 'json'), json.dumps(value).encode('utf-8'))
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def sweep(self):
+        now = time.time()
+        for name in os.listdir(self.path):
+            filename = os.path.join(self.path, name)
+            if name.endswith(('.pdf', '.json')):
+                max_age = self.result_ttl
+            elif name.endswith(('.lock', '.tmp', '.stale')):
+                # Claims of dead nodes and leftovers of interrupted writes
+                max_age = CLAIM_TTL
+            else:
+                continue
+            try:
+                if now - os.path.getmtime(filename) > max_age:
+                    os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+class SQLiteResultStore(ResultStore):
+    """Single SQLite file, for several processes on one host"""
+
+    def __init__(self, path, result_ttl=RESULT_TTL):
+        import sqlite3
+
+        self.path = path
+        self.result_ttl = result_ttl
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, pdf BLOB, pdf_updated REAL, job TEXT, job_updated REAL,
+                claimed_until REAL)""")
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+            try:
+                # Stores created before job records were swept
+                conn.execute("ALTER TABLE results ADD COLUMN job_updated REAL")
+            except sqlite3.OperationalError:
+                pass
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, column, key):
+        row = self._conn().execute(f"SELECT {column} FROM results WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, column, key, value):
+        self._conn().execute(
+            f"INSERT INTO results (key, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}", (key, value))
+
+    def get_pdf(self, key):
+        row = self._conn().execute(
+            "SELECT pdf, pdf_updated FROM results WHERE key = ?", (key,)).fetchone()
+        if not row or row[0] is None or self._expired(row[1]):
+            return None
+        return bytes(row[0])
+
+    def put_pdf(self, key, pdf_bytes):
+        self._conn().execute(
+            "INSERT INTO results (key, pdf, pdf_updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET pdf = excluded.pdf, pdf_updated = excluded.pdf_updated",
+            (key, bytes(pdf_bytes), time.time()))
+        self._maybe_sweep()
+
+    def get_job(self, key):
+        job = self._get('job', key)
+        job = json.loads(job) if job else None
+        return None if job is None or self._expired(job.get('updated')) else job
+
+    def set_job(self, key, state, **extra):
+        record = self._job_record(state, extra)
+        self._conn().execute(
+            "INSERT INTO results (key, job, job_updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET job = excluded.job, job_updated = excluded.job_updated",
+            (key, json.dumps(record), record['updated']))
+        self._maybe_sweep()
+
+    def claim(self, key, ttl=CLAIM_TTL):
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO results (key, claimed_until) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET claimed_until = excluded.claimed_until "
+            "WHERE claimed_until IS NULL OR claimed_until < ?", (key, now + ttl, now))
+        return cursor.rowcount == 1
+
+    def release(self, key):
+        self._conn().execute("UPDATE results SET claimed_until = NULL WHERE key = ?", (key,))
+
+    def get_state(self, key):
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_state(self, key, update):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = update(self.get_state(key))
+            conn.execute(
+                "INSERT INTO state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, json.dumps(value)))
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return value
+
+    def sweep(self):
+        now = time.time()
+        self._conn().execute(
+            "DELETE FROM results WHERE max(coalesce(pdf_updated, 0), coalesce(job_updated, 0)) < ? "
+            "AND (claimed_until IS NULL OR claimed_until < ?)", (now - self.result_ttl, now))
+
+class RedisResultStore(ResultStore):
+    """Redis (or anything speaking its get/set/delete API) shared by all nodes"""
+
+    def __init__(self, client, prefix="kairali:", result_ttl=RESULT_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.result_ttl = result_ttl
+
+    def _k(self, kind, key):
+        return f"{self.prefix}{kind}:{key}"
+
+    def get_pdf(self, key):
+        return self.client.get(self._k('pdf', key))
+
+    def put_pdf(self, key, pdf_bytes):
+        self.client.set(self._k('pdf', key), pdf_bytes, ex=self.result_ttl)
+
+    def get_job(self, key):
+        job = self.client.get(self._k('job', key))
+        return json.loads(job) if job else None
+
+    def set_job(self, key, state, **extra):
+        self.client.set(self._k('job', key), json.dumps(self._job_record(state, extra)),
+                        ex=self.result_ttl)
+
+    def claim(self, key, ttl=CLAIM_TTL):
+        return bool(self.client.set(self._k('lock', key), os.getpid(), nx=True, ex=ttl))
+
+    def release(self, key):
+        self.client.delete(self._k('lock', key))
+
+    def get_state(self, key):
+        value = self.client.get(self._k('state', key))
+        return json.loads(value) if value else None
+
+    def update_state(self, key, update):
+        lock = f"state:{key}"
+        while not self.claim(lock, ttl=STATE_LOCK_TTL):
+            time.sleep(0.01)
+        try:
+            value = update(self.get_state(key))
+            self.client.set(self._k('state', key), json.dumps(value))
+            return value
+        finally:
+            self.release(lock)
+
+def store_from_url(url):
+    """Build a store from RESULT_STORE, e.g. file:///var/pdfs, sqlite:///tmp/pdfs.db,
+    redis://host:6379/0. Returns None when sharing is disabled."""
+    if not url:
+        return None
+    if url.startswith('file://'):
+        return FileResultStore(url[len('file://'):])
+    if url.startswith('sqlite://'):
+        return SQLiteResultStore(url[len('sqlite://'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        return RedisResultStore(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported RESULT_STORE: {url}")
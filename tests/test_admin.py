@@ -0,0 +1,17 @@
+import app
+
+
+def test_slow_renders_closed_without_admin_token(monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    client = app.app.test_client()
+    assert client.get('/admin/slow-renders').status_code == 403
+    assert client.get('/admin/slow-renders/x', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_slow_renders_require_matching_token(monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 's3cret')
+    client = app.app.test_client()
+    assert client.get('/admin/slow-renders', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.get('/admin/slow-renders', headers={'X-Admin-Token': 's3cret'})
+    assert response.status_code == 200
+    assert 'captures' in response.json
@@ -0,0 +1,135 @@
+import io
+import re
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+import app
+from chunked_render import render_chunked, split_into_segments
+
+INVOICE = (
+    "<html><head><title>Invoice</title></head><body><h1>Kairali</h1>"
+    "<div><table><thead><tr><th>Item</th></tr></thead><tbody>"
+    + "".join(f"<tr><td>item {i}</td></tr>" for i in range(7))
+    + "</tbody></table><p>Total</p></div><p>Thanks</p></body></html>"
+)
+
+
+class FakeDocument:
+    def __init__(self, pages):
+        self.pages = [None] * pages
+
+    def write_pdf(self):
+        writer = PdfWriter()
+        for _ in self.pages:
+            writer.add_blank_page(100, 100)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+
+class FakeHTML:
+    """One page per table row, recording each segment's HTML and page counter reset"""
+    resets = []
+    strings = []
+
+    def __init__(self, string, base_url):
+        self.string = string
+        FakeHTML.strings.append(string)
+        reset = re.search(r"counter-reset: page (\d+)", string)
+        FakeHTML.resets.append(int(reset.group(1)) if reset else None)
+
+    def render(self):
+        return FakeDocument(self.string.count('<td>'))
+
+    def write_pdf(self):
+        return self.render().write_pdf()
+
+
+@pytest.fixture(autouse=True)
+def reset_fake():
+    FakeHTML.resets = []
+    FakeHTML.strings = []
+
+
+def test_segments_keep_header_and_totals_in_place():
+    segments = list(split_into_segments(INVOICE, 3))
+    assert len(segments) == 3
+    assert '<h1>' in segments[0] and '<h1>' not in segments[1]
+    assert 'Total' in segments[2] and 'Total' not in segments[0]
+    assert all('<thead>' in segment for segment in segments)
+    assert [segment.count('<td>') for segment in segments] == [3, 3, 1]
+
+
+def test_short_tables_are_not_split():
+    assert list(split_into_segments(INVOICE, 10)) == []
+    assert render_chunked(FakeHTML, INVOICE, 'https://example.com', 10) is None
+
+
+def test_page_numbers_continue_across_segments():
+    pdf = render_chunked(FakeHTML, INVOICE, 'https://example.com', 3)
+    assert len(PdfReader(io.BytesIO(pdf)).pages) == 7
+    assert FakeHTML.resets == [1, 4, 7]
+
+
+def test_no_footer_is_added():
+    render_chunked(FakeHTML, INVOICE, 'https://example.com', 3)
+    assert len(FakeHTML.strings) == 3
+    assert not any('@bottom' in string for string in FakeHTML.strings)
+
+
+def test_total_page_count_documents_render_in_one_pass():
+    html = INVOICE.replace('</head>', '<style>@page{@bottom-center{content: counter(pages)}}</style></head>')
+    assert render_chunked(FakeHTML, html, 'https://example.com', 3) is None
+
+
+def test_text_around_the_table_is_not_repeated():
+    html = ("<body>Bill to: ACME<div>Header note<table>"
+            + "".join(f"<tr><td>item {i}</td></tr>" for i in range(5))
+            + "</table>After text</div></body>")
+    segments = list(split_into_segments(html, 2))
+    assert len(segments) == 3
+    for text in ("Bill to: ACME", "Header note"):
+        assert [text in segment for segment in segments] == [True, False, False]
+    assert ["After text" in segment for segment in segments] == [False, False, True]
+
+
+def test_doctype_and_inline_svg_survive_the_split():
+    html = "<!DOCTYPE html>" + INVOICE.replace('<h1>Kairali</h1>', '<svg viewBox="0 0 10 10"><circle r="4"/></svg>')
+    first = next(split_into_segments(html, 3))
+    assert first.startswith('<!DOCTYPE html>')
+    assert '<svg viewBox="0 0 10 10"><circle r=4></circle></svg>' in first
+    assert 'ns0' not in first and 'xmlns' not in first
+
+
+def test_linked_stylesheets_render_in_one_pass():
+    html = INVOICE.replace('</head>', '<link rel="stylesheet" href="invoice.css"></head>')
+    assert render_chunked(FakeHTML, html, 'https://example.com', 3) is None
+    html = INVOICE.replace('</head>', '<style>@import url(print.css);</style></head>')
+    assert render_chunked(FakeHTML, html, 'https://example.com', 3) is None
+
+
+def test_failed_segmented_render_falls_back_to_one_pass(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("segment failed")
+
+    class Response:
+        status_code = 200
+        text = INVOICE
+
+    monkeypatch.setattr(app, 'CHUNK_ROWS', 3)
+    monkeypatch.setattr(app, 'render_chunked', broken)
+    monkeypatch.setattr(app, 'load_weasyprint', lambda: FakeHTML)
+    monkeypatch.setattr(app.requests, 'get', lambda url, timeout: Response())
+    pdf = app.convert_with_weasyprint_fallback('https://example.com/invoice')
+    assert len(PdfReader(io.BytesIO(pdf)).pages) == 7
+
+
+def test_real_weasyprint_segments_match_one_pass():
+    HTML = app.load_weasyprint()
+    if HTML is None:
+        pytest.skip("WeasyPrint cannot load here")
+    html = INVOICE.replace('item', '<svg width="8" height="8"><rect width="8" height="8"/></svg> item')
+    pdf = render_chunked(HTML, html, None, 3)
+    single = HTML(string=html).write_pdf()
+    assert len(PdfReader(io.BytesIO(pdf)).pages) >= len(PdfReader(io.BytesIO(single)).pages)
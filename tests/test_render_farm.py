@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def farm(monkeypatch):
+    monkeypatch.setattr(app, 'RENDER_FARM_WORKERS', '2')
+    monkeypatch.setattr(app, '_farm_slot', (0, 1))
+    yield
+    if app._farm is not None:
+        app._farm.shutdown(wait=True, cancel_futures=True)
+    app._farm = None
+
+
+def test_renders_through_farm(farm, monkeypatch):
+    monkeypatch.setattr(app, 'convert_url_to_pdf', lambda url, wait_time=20, adaptive=False: url.encode())
+    app.start_farm()
+    assert app.render_many(['a', 'b', 'c'], 1) == [b'a', b'b', b'c']
+
+
+def test_dead_renderer_falls_back_and_discards_farm(farm, monkeypatch):
+    parent = os.getpid()
+
+    def fake_convert(url, wait_time=20, adaptive=False):
+        if url == 'crash' and os.getpid() != parent:
+            os._exit(1)
+        return url.encode()
+
+    monkeypatch.setattr(app, 'convert_url_to_pdf', fake_convert)
+    app.start_farm()
+    broken = app._farm
+
+    assert app.render_many(['a', 'crash', 'b'], 1) == [b'a', b'crash', b'b']
+    assert app._farm is None
+
+    # Next request gets a fresh executor instead of BrokenProcessPool
+    rebuilt = app.get_farm()
+    assert rebuilt is not None and rebuilt is not broken
+
+
+def test_auto_size_splits_cores_between_gunicorn_workers(monkeypatch):
+    monkeypatch.setattr(app, 'RENDER_FARM_WORKERS', 'auto')
+    monkeypatch.setattr(app, '_farm_slot', (1, 2))
+    assert app.farm_size() == max(1, len(app._available_cpus()) // 2)
+
+
+def test_start_farm_forks_every_renderer_up_front(farm):
+    app.start_farm()
+    assert len(app._farm._processes) == 2
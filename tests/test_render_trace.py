@@ -0,0 +1,85 @@
+import importlib
+import types
+
+import pytest
+
+import app
+import render_trace
+
+URL = 'https://shop.example.com/invoice/42'
+
+
+@pytest.fixture
+def captures(monkeypatch, tmp_path):
+    """Tracing on, with captures kept in a temporary directory"""
+    monkeypatch.setattr(render_trace, 'CAPTURE_DIR', str(tmp_path))
+    monkeypatch.setattr(render_trace, 'SLOW_SECONDS', 0)
+    monkeypatch.setattr(app, 'check_wkhtmltopdf', lambda: True)
+
+    def fake_run(cmd, capture_output, timeout):
+        return types.SimpleNamespace(returncode=0, stdout=b'%PDF-1.4', stderr=b'Warning: slow font load')
+    monkeypatch.setattr(app.subprocess, 'run', fake_run)
+    monkeypatch.setattr(app.requests, 'get', lambda url, timeout: types.SimpleNamespace(status_code=200))
+    return tmp_path
+
+
+def test_slow_conversion_is_captured(captures):
+    assert app.convert_url_to_pdf(URL, 1, adaptive=True) == b'%PDF-1.4'
+    [capture_id] = render_trace.list_capture_ids()
+    capture = render_trace.load_capture(capture_id)
+    assert capture['url'] == URL
+    assert capture['wait_time'] == 1
+    assert 'profile' in capture
+
+    fetch, command, engine = capture['events']
+    assert fetch['kind'] == 'fetch' and fetch['url'] == URL and fetch['status'] == 200
+    assert command['kind'] == 'command' and command['argv'][0] == 'wkhtmltopdf'
+    assert engine == dict(engine, kind='engine', engine='wkhtmltopdf', returncode=0,
+                          stderr='Warning: slow font load')
+
+
+def test_fast_conversion_is_not_captured(captures, monkeypatch):
+    monkeypatch.setattr(render_trace, 'SLOW_SECONDS', 60)
+    assert app.convert_url_to_pdf(URL, 1, adaptive=True) == b'%PDF-1.4'
+    assert render_trace.list_capture_ids() == []
+
+
+def test_fetches_are_recorded(captures):
+    with render_trace.traced(URL):
+        with render_trace.timed_fetch(URL) as fields:
+            fields['status'] = 200
+        with pytest.raises(OSError):
+            with render_trace.timed_fetch(URL + '/logo.png'):
+                raise OSError('connection refused')
+
+    [capture_id] = render_trace.list_capture_ids()
+    fetched, failed = render_trace.load_capture(capture_id)['events']
+    assert fetched['kind'] == 'fetch' and fetched['status'] == 200 and 'seconds' in fetched
+    assert failed['url'] == URL + '/logo.png' and failed['error'] == 'connection refused'
+
+
+def test_nothing_is_traced_outside_a_conversion(captures):
+    render_trace.note('command', argv=['wkhtmltopdf'])
+    assert render_trace.url_fetcher() is None
+    assert render_trace.list_capture_ids() == []
+
+
+def test_capture_ring_keeps_newest(captures, monkeypatch):
+    monkeypatch.setattr(render_trace, 'MAX_CAPTURES', 3)
+    for i in range(5):
+        render_trace.save_capture({'url': f'{URL}?n={i}', 'started': 1700000000 + i,
+                                   'duration_seconds': 1.0, 'events': []})
+    urls = [capture['url'] for capture in render_trace.list_captures()]
+    assert urls == [f'{URL}?n={i}' for i in (4, 3, 2)]
+
+
+@pytest.mark.parametrize('name', ['PROFILE_SLOW_SECONDS', 'PROFILE_MAX_CAPTURES'])
+def test_bad_setting_disables_tracing_instead_of_failing(monkeypatch, name):
+    monkeypatch.setenv('PROFILE_SLOW_SECONDS', '5')
+    monkeypatch.setenv(name, 'five')
+    try:
+        importlib.reload(render_trace)
+        assert not render_trace.enabled()
+    finally:
+        monkeypatch.undo()
+        importlib.reload(render_trace)
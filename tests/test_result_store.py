@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+
+import pytest
+
+import app
+from result_store import FileResultStore, RedisResultStore, SQLiteResultStore, job_key
+
+
+class FakeRedis:
+    """Local stand-in for the get/set/delete subset of redis-py the store uses"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            current = self._data.get(key)
+            if nx and current and (current[1] is None or current[1] >= time.time()):
+                return None
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            self._data[key] = (value, time.time() + ex if ex is not None else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+@pytest.fixture(params=['file', 'sqlite', 'redis'])
+def make_store(request, tmp_path):
+    """Factory for stores sharing one backend, as separate instances would"""
+    redis = FakeRedis()
+
+    def make(result_ttl=3600):
+        if request.param == 'file':
+            return FileResultStore(str(tmp_path / 'pdfs'), result_ttl=result_ttl)
+        if request.param == 'sqlite':
+            return SQLiteResultStore(str(tmp_path / 'pdfs.db'), result_ttl=result_ttl)
+        return RedisResultStore(redis, result_ttl=result_ttl)
+    return make
+
+
+def test_pdf_and_job_roundtrip(make_store):
+    store = make_store()
+    key = job_key('job-1', 0, 'https://example.com/invoice/1', 20)
+    assert store.get_pdf(key) is None
+    assert store.get_job(key) is None
+
+    store.put_pdf(key, b'%PDF-1')
+    store.set_job(key, 'done', size_bytes=6)
+
+    other = make_store()
+    assert other.get_pdf(key) == b'%PDF-1'
+    assert other.get_job(key)['state'] == 'done'
+    assert other.get_job(key)['size_bytes'] == 6
+
+
+def test_results_expire(make_store):
+    store = make_store(result_ttl=-1)
+    store.put_pdf('k', b'%PDF')
+    store.set_job('k', 'done')
+    assert store.get_pdf('k') is None
+    assert store.get_job('k') is None
+
+
+def test_expired_records_are_swept_on_write(tmp_path):
+    stores = [FileResultStore(str(tmp_path / 'pdfs')), SQLiteResultStore(str(tmp_path / 'pdfs.db'))]
+    for store in stores:
+        store.put_pdf('old', b'%PDF')
+        store.set_job('old', 'done')
+        assert store.claim('old')
+        store.release('old')
+        assert store.claim('busy')
+        store.set_job('busy', 'rendering')
+
+        old = time.time() - 7200
+        if isinstance(store, FileResultStore):
+            for name in ('old.pdf', 'old.json', 'busy.json'):
+                os.utime(os.path.join(store.path, name), (old, old))
+        else:
+            store._conn().execute("UPDATE results SET pdf_updated = ?, job_updated = ?", (old, old))
+        store._last_sweep = 0
+        store.put_pdf('new', b'%PDF')
+
+        if isinstance(store, FileResultStore):
+            # The held claim outlives the records until CLAIM_TTL
+            assert sorted(os.listdir(store.path)) == ['busy.lock', 'new.pdf']
+        else:
+            keys = [row[0] for row in store._conn().execute("SELECT key FROM results ORDER BY key")]
+            assert keys == ['busy', 'new']
+
+
+def test_claim_is_exclusive_until_released(make_store):
+    first, second = make_store(), make_store()
+    assert first.claim('k')
+    assert not second.claim('k')
+    first.release('k')
+    assert second.claim('k')
+
+
+def test_stale_claim_can_be_taken_over(make_store):
+    first, second = make_store(), make_store()
+    assert first.claim('k', ttl=1)
+    if isinstance(first, FileResultStore):
+        old = time.time() - 10
+        os.utime(first._file('k', 'lock'), (old, old))
+    else:
+        time.sleep(1.1)
+    assert second.claim('k', ttl=1)
+
+
+def test_concurrent_claims_have_one_winner(make_store):
+    stores = [make_store() for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    wins = []
+
+    def race(store):
+        barrier.wait()
+        if store.claim('contested'):
+            wins.append(store)
+
+    threads = [threading.Thread(target=race, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(wins) == 1
+
+
+def test_job_keys_depend_on_options():
+    assert job_key('job', 0, 'u', 20) == job_key('job', 0, 'u', 20)
+    assert job_key('job', 0, 'u', 20) != job_key('job', 0, 'u', 5)
+    assert job_key('job', 0, 'u', 20) != job_key('other', 0, 'u', 20)
+
+
+def test_retry_on_another_node_is_served_from_store(make_store, monkeypatch):
+    node_a, node_b = make_store(), make_store()
+    renders = []
+
+    def fake_render(urls, wait_time=20):
+        renders.extend(urls)
+        return [url.encode() for url in urls]
+
+    monkeypatch.setattr(app, 'render_many', fake_render)
+    urls = ['https://example.com/1', 'https://example.com/2']
+    keys = [job_key('job', i, url, 20) for i, url in enumerate(urls)]
+
+    assert app.convert_many(urls, 20, node_a, keys) == [b'https://example.com/1', b'https://example.com/2']
+    assert app.convert_many(urls, 20, node_b, keys) == [b'https://example.com/1', b'https://example.com/2']
+    assert renders == urls
+
+
+def test_without_job_keys_nothing_is_shared(make_store, monkeypatch):
+    store = make_store()
+    renders = []
+    monkeypatch.setattr(app, 'render_many', lambda urls, wait_time=20: renders.extend(urls) or [b'x'] * len(urls))
+
+    app.convert_many(['u'], 20, store)
+    app.convert_many(['u'], 20, store)
+    assert renders == ['u', 'u']
+
+
+def test_waits_for_result_rendered_by_other_node(make_store, monkeypatch):
+    node_a, node_b = make_store(), make_store()
+    key = job_key('job', 0, 'u', 20)
+    assert node_a.claim(key)
+    monkeypatch.setattr(app, 'render_many', lambda urls, wait_time=20: pytest.fail('rendered twice'))
+
+    def finish_on_node_a():
+        time.sleep(0.2)
+        node_a.put_pdf(key, b'from-a')
+        node_a.set_job(key, 'done')
+        node_a.release(key)
+
+    thread = threading.Thread(target=finish_on_node_a)
+    thread.start()
+    assert app.convert_many(['u'], 20, node_b, [key]) == [b'from-a']
+    thread.join()
+
+
+def test_stale_job_state_is_not_trusted():
+    assert app.job_in_progress({'state': 'rendering', 'updated': time.time()})
+    assert not app.job_in_progress({'state': 'rendering', 'updated': time.time() - app.CLAIM_TTL - 1})
+    assert not app.job_in_progress({'state': 'done', 'updated': time.time()})
+    assert not app.job_in_progress(None)
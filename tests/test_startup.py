@@ -0,0 +1,35 @@
+import sys
+import types
+
+import pytest
+
+import app
+
+
+class BrokenWeasyPrint(types.ModuleType):
+    """Stands in for WeasyPrint installed without the pango/cairo libraries"""
+
+    def __getattr__(self, name):
+        raise OSError("cannot load library 'pango-1.0-0'")
+
+
+@pytest.fixture
+def broken_weasyprint(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'weasyprint', BrokenWeasyPrint('weasyprint'))
+    monkeypatch.setattr(app, '_weasyprint_html', None)
+    monkeypatch.setattr(app, '_weasyprint_error', None)
+    monkeypatch.setattr(app, 'check_wkhtmltopdf', lambda: True)
+
+
+def test_warm_up_survives_missing_system_libraries(broken_weasyprint):
+    app.warm_up()
+    assert app.cold_start['warm_up_seconds'] is not None
+    assert app.load_weasyprint() is None
+
+
+def test_health_reports_failed_import(broken_weasyprint):
+    app.load_weasyprint()
+    health = app.app.test_client().get('/health').json
+    assert health['weasyprint_available'] is False
+    assert 'OSError' in health['weasyprint_error']
+    assert 'import_seconds' in health['cold_start']
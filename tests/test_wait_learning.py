@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+import app
+from result_store import FileResultStore, SQLiteResultStore
+from wait_learning import DEFAULT_WAIT, WaitTimeModel
+
+URL = 'https://shop.example.com/invoice/42'
+
+
+def test_learns_tight_timeout_from_ready_times():
+    model = WaitTimeModel()
+    assert model.timeout_for(URL) == DEFAULT_WAIT
+    for _ in range(10):
+        model.record(URL, 0.8)
+    assert model.timeout_for('https://shop.example.com/invoice/7') == 2
+
+
+def test_timeout_widens_window():
+    model = WaitTimeModel()
+    for _ in range(10):
+        model.record(URL, 0.8)
+    model.record(URL, 2, capped=True)
+    stats = model.stats()['shop.example.com/invoice']
+    assert stats['timeouts'] == 1
+    assert stats['widen_factor'] == 2.0
+    assert model.timeout_for(URL) > 2
+
+
+def test_records_page_ready_time_not_render_time(monkeypatch):
+    model = WaitTimeModel()
+    monkeypatch.setattr(app, 'wait_model', model)
+    for _ in range(10):
+        app.record_ready_time(URL, 'Warning: x:1 KAIRALI_READY settled 800', 2)
+    # Ready at 0.9s within a 2s budget is not a timeout, however long layout took
+    app.record_ready_time(URL, 'Warning: x:1 KAIRALI_READY settled 900', 2)
+    stats = model.stats()['shop.example.com/invoice']
+    assert stats['timeouts'] == 0
+    assert stats['max_seconds'] == 0.9
+
+    app.record_ready_time(URL, 'Warning: x:1 KAIRALI_READY timeout 3500', 2)
+    assert model.stats()['shop.example.com/invoice']['timeouts'] == 1
+
+    app.record_ready_time(URL, 'no report', 2)
+    assert model.stats()['shop.example.com/invoice']['samples'] == 12
+
+
+def test_models_sharing_a_store_learn_together(tmp_path):
+    store = FileResultStore(str(tmp_path))
+    worker_a = WaitTimeModel(store=lambda: store)
+    worker_b = WaitTimeModel(store=lambda: store)
+    for _ in range(10):
+        worker_a.record(URL, 0.8)
+    assert worker_b.timeout_for(URL) == 2
+    assert worker_b.stats()['shop.example.com/invoice']['samples'] == 10
+
+
+@pytest.mark.parametrize('backend', ['file', 'sqlite'])
+def test_concurrent_records_are_not_lost(tmp_path, backend):
+    def make_store():
+        if backend == 'file':
+            return FileResultStore(str(tmp_path / 'store'))
+        return SQLiteResultStore(str(tmp_path / 'store.db'))
+    models = [WaitTimeModel(store=make_store) for _ in range(4)]
+
+    def record(model):
+        for _ in range(25):
+            model.record(URL, 0.8)
+
+    threads = [threading.Thread(target=record, args=(model,)) for model in models]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert models[0].stats()['shop.example.com/invoice']['samples'] == 100
+
+
+def test_learned_state_outlives_result_ttl(tmp_path):
+    store = FileResultStore(str(tmp_path), result_ttl=-1)
+    model = WaitTimeModel(store=lambda: store)
+    for _ in range(10):
+        model.record(URL, 0.8)
+    store.sweep()
+    assert model.timeout_for(URL) == 2
+    assert model.stats()['shop.example.com/invoice']['samples'] == 10
+
+
+def test_renderer_processes_forward_instead_of_recording(tmp_path):
+    store = FileResultStore(str(tmp_path))
+    renderer = WaitTimeModel(store=lambda: store)
+    renderer.forward = True
+    renderer.record(URL, 0.5)
+    assert renderer.stats() == {}
+    assert renderer.take_pending() == [(URL, 0.5, False)]
@@ -0,0 +1,134 @@
+# wait_learning.py - Learns how long pages from each host take to become ready
+import math
+import threading
+from urllib.parse import urlsplit
+
+from result_store import job_key
+
+DEFAULT_WAIT = 20        # Used until a host has enough samples (old fixed default)
+MIN_WAIT = 1             # Never wait less than this, however fast a host is
+MIN_SAMPLES = 5          # Samples needed before the learned timeout is trusted
+WINDOW = 100             # Rolling window of samples kept per host/pattern
+PERCENTILE = 95
+MARGIN = 1.5             # Headroom on top of the percentile
+MAX_WIDEN = 8
+
+def url_pattern(url):
+    """Group URLs by host and first path segment, e.g. shop.example.com/invoice"""
+    parts = urlsplit(url)
+    segment = parts.path.strip('/').split('/')[0]
+    if segment.isdigit():
+        segment = ''
+    return f"{parts.hostname or ''}/{segment}"
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+_INDEX_KEY = job_key('wait-times', 'patterns')
+
+def _pattern_key(pattern):
+    return job_key('wait-times', pattern)
+
+class WaitTimeModel:
+    """Rolling per-pattern ready times, turned into a tight timeout.
+
+    An outlier (a page that became ready after the p95, or never did within
+    its timeout) doubles the pattern's window; ordinary renders shrink it
+    back towards the p95.
+
+    store is a callable returning a result_store.ResultStore (or None). When
+    given, the learned state lives in that store's state space, which never
+    expires, and each sample is applied with update_state so every gunicorn
+    worker and instance sharing it learns from - and reports - the same
+    samples.
+    """
+
+    def __init__(self, store=None):
+        self._lock = threading.Lock()
+        self._store = store
+        self._patterns = {}
+        self.forward = False   # set in renderer processes, see take_pending()
+        self._pending = []
+
+    def _get_store(self):
+        return self._store() if self._store is not None else None
+
+    def _load(self, pattern):
+        store = self._get_store()
+        if store is not None:
+            return store.get_state(_pattern_key(pattern))
+        return self._patterns.get(pattern)
+
+    def _all_patterns(self):
+        store = self._get_store()
+        if store is None:
+            return list(self._patterns)
+        return store.get_state(_INDEX_KEY) or []
+
+    def timeout_for(self, url):
+        """Seconds to wait for url when the caller gave no wait_time"""
+        with self._lock:
+            return self._timeout(self._load(url_pattern(url)))
+
+    def _timeout(self, state):
+        if not state or len(state['samples']) < MIN_SAMPLES:
+            return DEFAULT_WAIT
+        learned = percentile(state['samples'], PERCENTILE) * MARGIN * state['widen']
+        return int(min(DEFAULT_WAIT, max(MIN_WAIT, math.ceil(learned))))
+
+    def record(self, url, seconds, capped=False):
+        """Record how long url took to become ready; capped means it never did"""
+        with self._lock:
+            if self.forward:
+                self._pending.append((url, seconds, capped))
+                return
+            pattern = url_pattern(url)
+
+            def update(state):
+                state = state or {'samples': [], 'widen': 1.0, 'timeouts': 0}
+                samples = state['samples']
+                if capped or (len(samples) >= MIN_SAMPLES and seconds > percentile(samples, PERCENTILE)):
+                    state['widen'] = min(MAX_WIDEN, state['widen'] * 2)
+                else:
+                    state['widen'] = max(1.0, state['widen'] * 0.8)
+                if capped:
+                    state['timeouts'] += 1
+                state['samples'] = (samples + [round(seconds, 3)])[-WINDOW:]
+                return state
+
+            store = self._get_store()
+            if store is None:
+                self._patterns[pattern] = update(self._patterns.get(pattern))
+                return
+            store.update_state(_pattern_key(pattern), update)
+            if pattern not in self._all_patterns():
+                store.update_state(_INDEX_KEY, lambda patterns: sorted(set(patterns or []) | {pattern}))
+
+    def take_pending(self):
+        """Observations made in this renderer process, to replay in the parent"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            return pending
+
+    def stats(self):
+        """Learned state per host/pattern, for the stats endpoint"""
+        with self._lock:
+            result = {}
+            for pattern in self._all_patterns():
+                state = self._load(pattern)
+                if not state or not state['samples']:
+                    continue
+                values = state['samples']
+                result[pattern] = {
+                    'samples': len(values),
+                    'p50_seconds': round(percentile(values, 50), 2),
+                    'p95_seconds': round(percentile(values, PERCENTILE), 2),
+                    'max_seconds': round(max(values), 2),
+                    'timeouts': state['timeouts'],
+                    'widen_factor': round(state['widen'], 2),
+                    'learned_wait_time': self._timeout(state)
+                }
+            return result